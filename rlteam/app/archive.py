@@ -0,0 +1,608 @@
+"""
+Append-only local archive of prompts, answers, latency and token usage.
+
+Records are written by a background thread as compact JSON lines into
+numbered segment files. When a segment reaches its size limit or age limit
+(daily by default) it is sealed: an index sidecar with its time range,
+sessions and record count is written next to it and sealed segments are
+compacted into larger ones. Segments whose records are all past the
+retention period are deleted whole; the writer checks for them on a timer,
+so a quiet archive expires old records too. Readers
+pick segments through the indexes and scan them with mmap, so queries never
+block the chat path.
+
+Compaction is tiered: rotated segments are level 0, and every
+COMPACT_FACTOR segments of one level are merged into one segment of the
+next level, so the number of files grows logarithmically with the archive.
+A compaction marker listing the merged segments is written before the
+merged file is swapped in, so a crash midway never leaves records twice.
+
+Every process (e.g. each gunicorn worker) writes into its own
+``writer-<n>`` subdirectory, claimed with an exclusive fcntl lock, so
+writers never touch each other's segments; queries merge all of them. A
+restarted process takes over a free writer directory and its data.
+
+Segments are kept as uncompressed JSON lines so they can be scanned in place
+through mmap; short keys keep them compact.
+"""
+
+import fcntl
+import json
+import logging
+import mmap
+import os
+import queue
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})\.jsonl$')
+MARKER_PATTERN = re.compile(r'^compact-(\d{8})\.json$')
+WRITER_PATTERN = re.compile(r'^writer-(\d+)$')
+
+# Number of segments of one level merged into one of the next level
+COMPACT_FACTOR = 4
+
+# Seconds between age and retention checks of the writer thread
+MAINTENANCE_INTERVAL = 300.0
+
+# Short on-disk keys and their public names
+FIELDS = {
+    't': 'ts',
+    's': 'session',
+    'q': 'prompt',
+    'a': 'answer',
+    'l': 'latency_ms',
+    'pt': 'prompt_tokens',
+    'ct': 'completion_tokens',
+}
+
+
+def _segment_name(seq: int) -> str:
+    return f"segment-{seq:08d}.jsonl"
+
+
+def _index_name(seq: int) -> str:
+    return f"segment-{seq:08d}.idx.json"
+
+
+def _marker_name(seq: int) -> str:
+    return f"compact-{seq:08d}.json"
+
+
+def _write_json(path: str, data: dict) -> None:
+    """Write a small JSON file atomically"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def _encode(record: dict) -> bytes:
+    """Encode a record as one compact JSON line"""
+    return (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _decode(raw: dict) -> dict:
+    """Expand the short on-disk keys of a record"""
+    return {FIELDS.get(key, key): value for key, value in raw.items()}
+
+
+def _parse(line: bytes) -> Optional[dict]:
+    """Decode one segment line, or None if it is damaged"""
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(raw, dict) or 't' not in raw or 's' not in raw:
+        return None
+    return raw
+
+
+def _scan(path: str) -> Iterator[bytes]:
+    """Yield the lines of a segment through a read-only memory map"""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                size = len(mm)
+                while start < size:
+                    end = mm.find(b'\n', start)
+                    if end == -1:
+                        # Partially written last line
+                        return
+                    yield mm[start:end]
+                    start = end + 1
+    except FileNotFoundError:
+        # Removed by compaction while we were listing
+        return
+
+
+def _segment_seqs(directory: str) -> List[int]:
+    """List the sequence numbers of all segments in a directory"""
+    seqs = []
+    for name in os.listdir(directory):
+        match = SEGMENT_PATTERN.match(name)
+        if match:
+            seqs.append(int(match.group(1)))
+    return sorted(seqs)
+
+
+def _read_indexes(directory: str) -> Dict[int, dict]:
+    """Load the index sidecars of the sealed segments in a directory"""
+    indexes = {}
+    for seq in _segment_seqs(directory):
+        path = os.path.join(directory, _index_name(seq))
+        try:
+            with open(path) as f:
+                indexes[seq] = json.load(f)
+        except FileNotFoundError:
+            continue
+        except ValueError:
+            logger.warning(f"Ignoring corrupt archive index {path}")
+    return indexes
+
+
+def _compacted_sources(directory: str) -> set:
+    """Segments already merged into another one whose removal is pending"""
+    sources = set()
+    for name in os.listdir(directory):
+        match = MARKER_PATTERN.match(name)
+        if not match or not os.path.exists(os.path.join(directory, _segment_name(int(match.group(1))))):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                sources.update(json.load(f)['sources'])
+        except (OSError, ValueError, KeyError):
+            continue
+    return sources
+
+
+def _matches(index: dict, start: Optional[float], end: Optional[float],
+             session: Optional[str]) -> bool:
+    """Whether a sealed segment may hold records matching a query"""
+    if index['count'] == 0:
+        return False
+    if start is not None and index['max_ts'] < start:
+        return False
+    if end is not None and index['min_ts'] >= end:
+        return False
+    if session is not None and session not in index['sessions']:
+        return False
+    return True
+
+
+def _truncate_partial_line(path: str) -> None:
+    """Cut a segment back to its last complete line after a crash"""
+    try:
+        with open(path, 'r+b') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[size - 1:size] == b'\n':
+                    return
+                keep = mm.rfind(b'\n') + 1
+            f.truncate(keep)
+        logger.warning(f"Dropped {size - keep} bytes of a partial record from {path}")
+    except FileNotFoundError:
+        return
+
+
+class ConversationArchive:
+    """Segment-based append-only store of chat exchanges"""
+
+    def __init__(self, directory: str, segment_max_bytes: int = 16 * 1024 * 1024,
+                 retention_days: Optional[float] = None, max_pending: int = 10000,
+                 segment_max_age: float = 86400.0,
+                 maintenance_interval: float = MAINTENANCE_INTERVAL):
+        """
+        Initialize the archive and start its writer thread.
+
+        Args:
+            directory: Directory holding the writer directories
+            segment_max_bytes: Size at which the active segment is sealed
+            retention_days: Delete segments whose records are all older
+            max_pending: Records buffered in memory before new ones are dropped
+            segment_max_age: Seconds after its first record at which the
+                active segment is sealed
+            maintenance_interval: Seconds between age and retention checks
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.retention_days = retention_days
+        self.segment_max_age = segment_max_age
+        self.maintenance_interval = maintenance_interval
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = None
+        self.writer_directory = self._claim_writer_directory()
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._indexes: Dict[int, dict] = {}
+        self._recover_compactions()
+        self._indexes = _read_indexes(self.writer_directory)
+
+        # Seal segments left unindexed by an earlier crash, except the last one
+        seqs = _segment_seqs(self.writer_directory)
+        for seq in seqs[:-1]:
+            if seq not in self._indexes:
+                self._seal(seq)
+
+        self._active_seq = seqs[-1] if seqs else 1
+        if self._active_seq in self._indexes:
+            self._active_seq += 1
+        self._next_seq = self._active_seq + 1
+        active_path = self._segment_path(self._active_seq)
+        _truncate_partial_line(active_path)
+        self._active = open(active_path, 'ab')
+        self._active_first_ts = None
+        for line in _scan(active_path):
+            raw = _parse(line)
+            if raw is not None:
+                self._active_first_ts = raw['t']
+                break
+
+        self._writer = threading.Thread(target=self._run, name='archive-writer', daemon=True)
+        self._writer.start()
+
+    def _claim_writer_directory(self) -> str:
+        """Lock the first writer directory no other process holds"""
+        n = 0
+        while True:
+            path = os.path.join(self.directory, f"writer-{n}")
+            os.makedirs(path, exist_ok=True)
+            lock_file = open(os.path.join(path, '.lock'), 'a')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                n += 1
+                continue
+            self._lock_file = lock_file
+            return path
+
+    def _segment_path(self, seq: int) -> str:
+        """Path of one of this process's segments"""
+        return os.path.join(self.writer_directory, _segment_name(seq))
+
+    def _recover_compactions(self) -> None:
+        """Finish or undo compactions interrupted by a crash"""
+        for name in sorted(os.listdir(self.writer_directory)):
+            path = os.path.join(self.writer_directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+                continue
+            match = MARKER_PATTERN.match(name)
+            if not match:
+                continue
+
+            merged_seq = int(match.group(1))
+            try:
+                with open(path) as f:
+                    marker = json.load(f)
+                sources, level = marker['sources'], marker['level']
+            except (OSError, ValueError, KeyError):
+                logger.warning(f"Ignoring corrupt compaction marker {path}")
+                os.remove(path)
+                continue
+
+            if os.path.exists(self._segment_path(merged_seq)):
+                # Merged segment is in place: finish removing the originals
+                self._write_index(merged_seq, level)
+                self._remove(sources)
+                logger.warning(f"Finished interrupted compaction into {_segment_name(merged_seq)}")
+            os.remove(path)
+
+    def record(self, session: str, prompt: str, answer: str, latency_ms: float,
+               prompt_tokens: Optional[int] = None,
+               completion_tokens: Optional[int] = None) -> None:
+        """
+        Queue one exchange for archiving without blocking.
+
+        Args:
+            session: Session or client identity
+            prompt: Sanitized user message
+            answer: Bot response
+            latency_ms: Upstream latency in milliseconds
+            prompt_tokens: Prompt tokens reported by the backend, if any
+            completion_tokens: Completion tokens reported by the backend, if any
+        """
+        record = {
+            't': round(time.time(), 3),
+            's': session,
+            'q': prompt,
+            'a': answer,
+            'l': round(latency_ms, 1),
+        }
+        if prompt_tokens is not None:
+            record['pt'] = prompt_tokens
+        if completion_tokens is not None:
+            record['ct'] = completion_tokens
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        """Writer thread: append queued records, rotate segments and apply retention"""
+        # Check right away, so a reopened archive drops what expired meanwhile
+        next_maintenance = time.monotonic()
+        while True:
+            try:
+                batch = [self._queue.get(timeout=max(0.0, next_maintenance - time.monotonic()))]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            records = [record for record in batch if record is not None]
+            try:
+                self._write(records)
+            except Exception as e:
+                # Keep the writer alive; the records of this batch are lost
+                logger.error(f"Failed to write archive records: {str(e)}", exc_info=True)
+
+            if not stop and time.monotonic() >= next_maintenance:
+                try:
+                    self._maintain()
+                except Exception as e:
+                    logger.error(f"Archive maintenance failed: {str(e)}", exc_info=True)
+                next_maintenance = time.monotonic() + self.maintenance_interval
+
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._active.close()
+                self._lock_file.close()
+                return
+
+    def _write(self, records: List[dict]) -> None:
+        """Append records to the active segment (writer thread only)"""
+        if records:
+            self._active.write(b''.join(_encode(record) for record in records))
+            self._active.flush()
+            if self._active_first_ts is None:
+                self._active_first_ts = records[0]['t']
+        if self._active.tell() >= self.segment_max_bytes:
+            self._rotate()
+
+    def _maintain(self) -> None:
+        """Seal an aged active segment and drop expired ones (writer thread only)"""
+        first_ts = self._active_first_ts
+        if first_ts is not None:
+            now = time.time()
+            due = now - first_ts >= self.segment_max_age
+            if self.retention_days is not None:
+                # Its oldest record expired: seal it so it can be dropped
+                due = due or first_ts < now - self.retention_days * 86400
+            if due:
+                self._rotate()
+                return
+        self._compact()
+
+    def _build_index(self, path: str) -> dict:
+        """Scan a segment and summarize it for queries"""
+        index = {'min_ts': None, 'max_ts': None, 'count': 0, 'sessions': []}
+        sessions = set()
+        for line in _scan(path):
+            raw = _parse(line)
+            if raw is None:
+                continue
+            ts = raw['t']
+            index['min_ts'] = ts if index['min_ts'] is None else min(index['min_ts'], ts)
+            index['max_ts'] = ts if index['max_ts'] is None else max(index['max_ts'], ts)
+            index['count'] += 1
+            sessions.add(raw['s'])
+        index['sessions'] = sorted(sessions)
+        return index
+
+    def _write_index(self, seq: int, level: int = 0) -> dict:
+        """Build and write the index sidecar of a segment"""
+        index = self._build_index(self._segment_path(seq))
+        index['level'] = level
+        _write_json(os.path.join(self.writer_directory, _index_name(seq)), index)
+        return index
+
+    def _seal(self, seq: int) -> None:
+        """Index a finished segment so queries can select it"""
+        index = self._write_index(seq)
+        with self._lock:
+            self._indexes[seq] = index
+
+    def _remove(self, seqs: List[int]) -> None:
+        """Delete sealed segments and their indexes"""
+        with self._lock:
+            for seq in seqs:
+                self._indexes.pop(seq, None)
+        for seq in seqs:
+            for name in (_index_name(seq), _segment_name(seq)):
+                try:
+                    os.remove(os.path.join(self.writer_directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _rotate(self) -> None:
+        """Seal the active segment, compact and start a new one (writer thread only)"""
+        # Seal first: if it fails the active segment stays open and in use
+        self._seal(self._active_seq)
+
+        try:
+            self._compact()
+        except Exception as e:
+            logger.error(f"Archive compaction failed: {str(e)}", exc_info=True)
+
+        new_seq = self._next_seq
+        new_active = open(self._segment_path(new_seq), 'ab')
+        old_active = self._active
+        with self._lock:
+            self._active_seq = new_seq
+            self._next_seq += 1
+        self._active = new_active
+        self._active_first_ts = None
+        old_active.close()
+
+    def _compact(self) -> None:
+        """
+        Drop expired segments and merge same-level ones (writer thread only).
+
+        A segment is deleted once all its records are past retention; it is
+        never rewritten for retention. Whenever COMPACT_FACTOR live segments
+        share a level, the oldest of them are merged into one segment of the
+        next level, so at most COMPACT_FACTOR - 1 segments remain per level
+        and the number of files grows logarithmically with the archive size.
+        With retention, segments are only merged while the result spans at
+        most a COMPACT_FACTOR-th of the retention period, so merging never
+        holds on to expired records for long.
+        """
+        with self._lock:
+            sealed = sorted(self._indexes.items())
+
+        if self.retention_days is not None:
+            cutoff = time.time() - self.retention_days * 86400
+            expired = [
+                seq for seq, index in sealed
+                if index['count'] == 0 or index['max_ts'] < cutoff
+            ]
+            if expired:
+                self._remove(expired)
+                logger.info(f"Removed {len(expired)} expired archive segments")
+
+        merged = True
+        while merged:
+            merged = False
+            with self._lock:
+                sealed = sorted(self._indexes.items())
+            levels: Dict[int, List[tuple]] = {}
+            for seq, index in sealed:
+                levels.setdefault(index.get('level', 0), []).append((seq, index))
+
+            for level in sorted(levels):
+                group = levels[level][:COMPACT_FACTOR]
+                if len(group) < COMPACT_FACTOR:
+                    continue
+                if self.retention_days is not None:
+                    span = max(i['max_ts'] for _, i in group) - min(i['min_ts'] for _, i in group)
+                    if span > self.retention_days * 86400 / COMPACT_FACTOR:
+                        continue
+                self._merge([seq for seq, _ in group], level + 1)
+                merged = True
+                break
+
+    def _merge(self, candidates: List[int], level: int) -> None:
+        """Merge sealed segments into one new segment (writer thread only)"""
+        merged_seq = self._next_seq
+        self._next_seq += 1
+        merged_path = self._segment_path(merged_seq)
+        tmp = merged_path + '.tmp'
+        with open(tmp, 'wb') as out:
+            for seq in candidates:
+                for line in _scan(self._segment_path(seq)):
+                    if _parse(line) is not None:
+                        out.write(line + b'\n')
+
+        # Record the swap first; recovery completes it after a crash
+        marker = os.path.join(self.writer_directory, _marker_name(merged_seq))
+        _write_json(marker, {'sources': candidates, 'level': level})
+        os.replace(tmp, merged_path)
+        index = self._write_index(merged_seq, level)
+
+        with self._lock:
+            self._indexes[merged_seq] = index
+            for seq in candidates:
+                self._indexes.pop(seq, None)
+        self._remove(candidates)
+        os.remove(marker)
+
+        logger.info(f"Compacted {len(candidates)} archive segments into {_segment_name(merged_seq)}")
+
+    def flush(self) -> None:
+        """Block until every queued record has been written"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write pending records, stop the writer thread and free the writer directory"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              session: Optional[str] = None, limit: Optional[int] = None,
+              fields: Optional[Sequence[str]] = None) -> List[dict]:
+        """
+        Read archived exchanges of all writers.
+
+        Args:
+            start: Only records at or after this Unix timestamp
+            end: Only records before this Unix timestamp
+            session: Only records of this session
+            limit: Return at most this many of the most recent matches
+            fields: Only keep these keys (plus ts) of each record, e.g. to
+                scan prompts without holding every answer in memory
+
+        Returns:
+            Matching records ordered by time, with keys ts, session, prompt,
+            answer, latency_ms and, when known, prompt_tokens and
+            completion_tokens
+        """
+        # This process's segments: indexes in memory plus the active segment
+        with self._lock:
+            paths = [
+                self._segment_path(seq) for seq, index in sorted(self._indexes.items())
+                if _matches(index, start, end, session)
+            ]
+            paths.append(self._segment_path(self._active_seq))
+
+        # Other writers' segments: indexes from disk, unindexed ones in full
+        for name in sorted(os.listdir(self.directory)):
+            other = os.path.join(self.directory, name)
+            if not WRITER_PATTERN.match(name) or other == self.writer_directory:
+                continue
+            indexes = _read_indexes(other)
+            compacted = _compacted_sources(other)
+            for seq in _segment_seqs(other):
+                if seq in compacted:
+                    continue
+                if seq not in indexes or _matches(indexes[seq], start, end, session):
+                    paths.append(os.path.join(other, _segment_name(seq)))
+
+        # Cheap byte filter before decoding each line
+        needle = None
+        if session is not None:
+            needle = b'"s":' + json.dumps(session, ensure_ascii=False).encode('utf-8')
+
+        results = []
+        for path in paths:
+            for line in _scan(path):
+                if needle is not None and needle not in line:
+                    continue
+                raw = _parse(line)
+                if raw is None:
+                    continue
+                if start is not None and raw['t'] < start:
+                    continue
+                if end is not None and raw['t'] >= end:
+                    continue
+                if session is not None and raw['s'] != session:
+                    continue
+                record = _decode(raw)
+                if fields is not None:
+                    record = {key: record[key] for key in ('ts', *fields) if key in record}
+                results.append(record)
+
+        results.sort(key=lambda record: record['ts'])
+        if limit is not None:
+            results = results[-limit:]
+        return results
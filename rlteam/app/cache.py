@@ -0,0 +1,99 @@
+"""
+In-memory cache of completions for repeated questions.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a sanitized question into a cache key.
+
+    Args:
+        text: Sanitized user message
+
+    Returns:
+        Lowercased text with collapsed whitespace and no trailing punctuation
+    """
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return text.rstrip('?!. ')
+
+
+class CompletionCache:
+    """Thread-safe LRU cache of answers with a time-to-live"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached answers
+            ttl: Seconds an answer stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[str]:
+        """
+        Look up the cached answer for a question.
+
+        Args:
+            question: Sanitized user message
+
+        Returns:
+            The cached answer, or None if missing or expired
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def contains(self, question: str) -> bool:
+        """Check for a valid cached answer without counting a hit or miss"""
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def set(self, question: str, answer: str) -> None:
+        """
+        Cache the answer for a question.
+
+        Args:
+            question: Sanitized user message
+            answer: Bot response
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        """Return a snapshot of the cache usage"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,106 @@
+"""
+Helpers for hedged (speculative duplicate) upstream requests.
+
+A hedge is a second copy of a slow request. It is fired only when the first
+copy has not answered within a high percentile of recent latencies, and the
+number of hedges is capped at a fraction of recent requests so a slow
+backend is not made slower by doubling its load.
+"""
+
+import threading
+from collections import deque
+from typing import Optional
+
+
+class LatencyTracker:
+    """Sliding window of recent upstream latencies"""
+
+    def __init__(self, window: int = 200):
+        """
+        Initialize the tracker.
+
+        Args:
+            window: Number of most recent latencies kept
+        """
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        """Record one request latency in seconds"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        """Return the number of samples in the window"""
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Nearest-rank percentile of the recorded latencies.
+
+        Args:
+            pct: Percentile between 0 and 100
+
+        Returns:
+            Latency in seconds, or None if nothing was recorded yet
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+        return ordered[index]
+
+
+class HedgeBudget:
+    """Caps hedged requests at a fraction of recent requests"""
+
+    def __init__(self, ratio: float = 0.1, max_credit: float = 2.0):
+        """
+        Initialize the budget.
+
+        Every request earns ratio hedge credits and every hedge spends one.
+        Credit is capped at max_credit, so a long quiet period cannot bank
+        enough hedges to double the load once the backend slows down.
+
+        Args:
+            ratio: Maximum hedges per request, e.g. 0.1 for 10%
+            max_credit: Maximum hedges that can be saved up
+        """
+        self.ratio = ratio
+        self.max_credit = max_credit
+        self._lock = threading.Lock()
+        self._credit = 0.0
+        self.requests = 0
+        self.hedges = 0
+
+    def record_request(self) -> None:
+        """Count one primary request"""
+        with self._lock:
+            self.requests += 1
+            self._credit = min(self.max_credit, self._credit + self.ratio)
+
+    def try_acquire(self) -> bool:
+        """
+        Take one hedge from the budget if it is not exhausted.
+
+        Returns:
+            True if a hedge may be sent
+        """
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            self.hedges += 1
+            return True
+
+    def stats(self) -> dict:
+        """Return a snapshot of the budget usage"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'ratio': self.ratio,
+                'credit': round(self._credit, 2),
+            }
@@ -3,27 +3,72 @@ LiteMAAS API client for integrating with the LLM backend.
 """
 
 import logging
+import threading
+import time
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Optional
 
+from app.hedging import HedgeBudget, LatencyTracker
+from app.tokenizer import UsageDriftTracker, count_tokens, plan_max_tokens
+
 logger = logging.getLogger(__name__)
 
+# Chat template tokens added per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Hedge delay used until enough latencies were observed
+HEDGE_INITIAL_DELAY = 5.0
+HEDGE_MIN_SAMPLES = 20
+
+# Seconds an upstream request may take, hedges included
+REQUEST_TIMEOUT = 30.0
+
 
 class LiteMAASClient:
     """Client for interacting with the LiteMAAS API"""
 
-    def __init__(self, base_url: str, api_key: str):
+    def __init__(self, base_url: str, api_key: str, context_window: int = 8192,
+                 hedge: bool = False, hedge_percentile: float = 95.0,
+                 hedge_budget: float = 0.1, hedge_min_delay: float = 1.0,
+                 hedge_base_url: Optional[str] = None,
+                 hedge_model: Optional[str] = None, scheduler=None):
         """
         Initialize the LiteMAAS client.
 
         Args:
             base_url: Base URL for the LiteMAAS API
             api_key: API key for authentication
+            context_window: Model context window in tokens
+            hedge: Send a second request when the first one is slow
+            hedge_percentile: Latency percentile after which to hedge
+            hedge_budget: Maximum fraction of requests that may be hedged
+            hedge_min_delay: Never hedge earlier than this many seconds
+            hedge_base_url: Send hedges to this backend instead of base_url
+            hedge_model: Send hedges to this model instead of the default
+            scheduler: Optional FairScheduler whose capacity hedges count against
         """
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
+        self.context_window = context_window
+        self.usage_drift = UsageDriftTracker()
+        self._local = threading.local()
         #self.model = "DeepSeek-R1-Distill-Qwen-14B-W4A16"
         self.model = "Granite-3.3-8B-Instruct"
+
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_base_url = (hedge_base_url or base_url).rstrip('/')
+        self.hedge_model = hedge_model or self.model
+        self.hedge_budget = HedgeBudget(ratio=hedge_budget)
+        self.scheduler = scheduler
+        self.latency = LatencyTracker()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=16, thread_name_prefix='litemaas-hedge')
+            if hedge else None
+        )
         self.system_prompt = """You are a friendly Open Source Mentor Bot for a Red Hat hackathon.
 
 Your role:
@@ -35,13 +80,172 @@ Your role:
 Be warm, encouraging, and concise. For greetings, introduce yourself briefly.
 """
 
-    def get_completion(self, user_message: str, max_tokens: int = 1500) -> str:
+    def estimate_prompt_tokens(self, user_message: str) -> int:
+        """
+        Estimate the prompt tokens of a request for user_message.
+
+        Args:
+            user_message: The user's input message
+
+        Returns:
+            Approximate prompt token count including chat template overhead
+        """
+        return (
+            count_tokens(self.system_prompt)
+            + count_tokens(user_message)
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+
+    def last_usage(self) -> dict:
+        """
+        Token usage reported for the calling thread's last completion.
+
+        Returns:
+            The backend's usage block, empty if it reported none
+        """
+        return getattr(self._local, 'usage', {})
+
+    def last_succeeded(self) -> bool:
+        """
+        Whether the calling thread's last completion returned a real answer.
+
+        Returns:
+            False if get_completion returned one of its fallback messages
+        """
+        return getattr(self._local, 'succeeded', False)
+
+    def hedge_delay(self) -> float:
+        """
+        Seconds to wait for the first request before sending a hedge.
+
+        Returns:
+            The configured latency percentile of recent requests, or an
+            initial delay until enough requests were observed
+        """
+        if self.latency.count() < HEDGE_MIN_SAMPLES:
+            return max(self.hedge_min_delay, HEDGE_INITIAL_DELAY)
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+
+    def _post(self, http, endpoint: str, headers: dict, payload: dict,
+              timeout: float = REQUEST_TIMEOUT) -> dict:
+        """
+        Send one chat completion request.
+
+        Args:
+            http: The requests module or a requests.Session
+            endpoint: Chat completions URL
+            headers: Request headers
+            payload: JSON payload
+            timeout: Seconds to wait for the backend
+
+        Returns:
+            The decoded JSON response
+        """
+        logger.debug(f"Sending request to {endpoint}")
+
+        start = time.monotonic()
+        response = http.post(
+            endpoint,
+            json=payload,
+            headers=headers,
+            timeout=timeout
+        )
+
+        response.raise_for_status()
+        result = response.json()
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    def _hedged_post(self, endpoint: str, headers: dict, payload: dict) -> dict:
+        """
+        Send a request and hedge it with a second one if it is slow.
+
+        The first response to succeed wins. The loser's session is closed;
+        requests has no way to abort a call in flight, so its worker thread
+        finishes in the background and its result is discarded. The hedge
+        only gets the time left of the original REQUEST_TIMEOUT.
+
+        When a scheduler is set, a hedge is only sent if it can take a free
+        slot, and that slot is held until both calls have finished, so the
+        loser still running upstream keeps counting against capacity.
+
+        Args:
+            endpoint: Chat completions URL
+            headers: Request headers
+            payload: JSON payload
+
+        Returns:
+            The decoded JSON response of the winning request
+        """
+        self.hedge_budget.record_request()
+
+        start = time.monotonic()
+        sessions = [requests.Session()]
+        primary = self._executor.submit(self._post, sessions[0], endpoint, headers, payload)
+        try:
+            try:
+                return primary.result(timeout=self.hedge_delay())
+            except FutureTimeoutError:
+                pass
+
+            remaining = REQUEST_TIMEOUT - (time.monotonic() - start)
+            if remaining <= 1.0:
+                return primary.result()
+            if self.scheduler is not None and not self.scheduler.try_acquire():
+                return primary.result()
+            if not self.hedge_budget.try_acquire():
+                if self.scheduler is not None:
+                    self.scheduler.release()
+                return primary.result()
+
+            logger.info("LiteMAAS request is slow, sending hedged request")
+            hedge_endpoint = f"{self.hedge_base_url}/v1/chat/completions"
+            hedge_payload = dict(payload, model=self.hedge_model)
+            sessions.append(requests.Session())
+            hedge = self._executor.submit(
+                self._post, sessions[1], hedge_endpoint, headers, hedge_payload, remaining
+            )
+            if self.scheduler is not None:
+                self._release_when_done([primary, hedge])
+
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        for loser in pending:
+                            loser.cancel()
+                        return future.result()
+
+            # Both failed: report the primary's error
+            return primary.result()
+        finally:
+            for session in sessions:
+                session.close()
+
+    def _release_when_done(self, futures: list) -> None:
+        """Release one scheduler slot once all futures have finished"""
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self.scheduler.release()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def get_completion(self, user_message: str, max_tokens: Optional[int] = None) -> str:
         """
         Get a completion from the LiteMAAS API.
 
         Args:
             user_message: The user's input message
-            max_tokens: Maximum tokens in the response
+            max_tokens: Maximum tokens in the response; planned from the
+                question class and remaining context window when omitted
 
         Returns:
             The bot's response text
@@ -49,9 +253,15 @@ Be warm, encouraging, and concise. For greetings, introduce yourself briefly.
         Raises:
             Exception: If the API request fails
         """
+        self._local.usage = {}
+        self._local.succeeded = False
         try:
             endpoint = f"{self.base_url}/v1/chat/completions"
 
+            prompt_tokens = self.estimate_prompt_tokens(user_message)
+            if max_tokens is None:
+                max_tokens = plan_max_tokens(user_message, prompt_tokens, self.context_window)
+
             headers = {
                 'Content-Type': 'application/json',
                 'Authorization': f'Bearer {self.api_key}'
@@ -74,18 +284,14 @@ Be warm, encouraging, and concise. For greetings, introduce yourself briefly.
                 'top_p': 0.9
             }
 
-            logger.debug(f"Sending request to {endpoint}")
-
-            response = requests.post(
-                endpoint,
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-
-            response.raise_for_status()
+            if self.hedge:
+                result = self._hedged_post(endpoint, headers, payload)
+            else:
+                result = self._post(requests, endpoint, headers, payload)
 
-            result = response.json()
+            usage = result.get('usage') or {}
+            self._local.usage = usage
+            self.usage_drift.record(prompt_tokens, usage.get('prompt_tokens'))
 
             # Extract the response text
             if 'choices' in result and len(result['choices']) > 0:
@@ -128,6 +334,7 @@ Be warm, encouraging, and concise. For greetings, introduce yourself briefly.
                             content = reasoning[:600] if len(reasoning) > 600 else reasoning
 
                 if content:
+                    self._local.succeeded = True
                     return content
                 else:
                     logger.error(f"No content in message: {message}")
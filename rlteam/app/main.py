@@ -3,10 +3,25 @@ Main Flask application for the Open Source Mentor Bot.
 """
 
 import os
+import hmac
+import time
+import atexit
 import logging
+from functools import partial
 from flask import Flask, request, jsonify, render_template_string
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.archive import ConversationArchive
+from app.cache import CompletionCache
 from app.litemaas_client import LiteMAASClient
+from app.scheduler import (
+    FairScheduler,
+    SchedulerRejected,
+    PRIORITY_HEALTH,
+    QUESTION_CLASS_PRIORITY,
+)
+from app.tokenizer import QUESTION_CLASS_MAX_TOKENS, classify_question, count_tokens
 from app.utils import sanitize_input, validate_chat_request
+from app.warmup import CacheWarmer, load_questions_file, mine_top_questions, shard_of
 
 # Configure logging
 logging.basicConfig(
@@ -18,12 +33,168 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 
+# Take the client address from the X-Forwarded-For entries added by our own
+# proxies (the OpenShift router by default), never from client-supplied ones
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 1))
+if TRUSTED_PROXY_COUNT > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Shared secret that synthetic health-check prompts send in X-Health-Check
+HEALTH_CHECK_TOKEN = os.getenv('HEALTH_CHECK_TOKEN', '')
+
+# Fair scheduler for upstream LiteMAAS capacity (per worker process, so a pod
+# allows workers x LITEMAAS_MAX_CONCURRENT calls). Gunicorn runs more threads
+# than slots so that the scheduler, not gunicorn, decides who goes next.
+scheduler = FairScheduler(
+    max_concurrent=int(os.getenv('LITEMAAS_MAX_CONCURRENT', 4)),
+    max_queue=int(os.getenv('SCHEDULER_MAX_QUEUE', 100))
+)
+
 # Initialize LiteMAAS client
 litemaas_client = LiteMAASClient(
     base_url=os.getenv('LITEMAAS_BASE_URL', 'https://lite-maas.example/api'),
-    api_key=os.getenv('LITEMAAS_API_KEY', 'changeme')
+    api_key=os.getenv('LITEMAAS_API_KEY', 'changeme'),
+    context_window=int(os.getenv('LITEMAAS_CONTEXT_WINDOW', 8192)),
+    hedge=os.getenv('LITEMAAS_HEDGE', 'false').lower() == 'true',
+    hedge_percentile=float(os.getenv('LITEMAAS_HEDGE_PERCENTILE', 95)),
+    hedge_budget=float(os.getenv('LITEMAAS_HEDGE_BUDGET', 0.1)),
+    hedge_base_url=os.getenv('LITEMAAS_HEDGE_BASE_URL') or None,
+    hedge_model=os.getenv('LITEMAAS_HEDGE_MODEL') or None,
+    scheduler=scheduler
 )
 
+# Seconds a request may wait for an upstream slot before the browser or
+# router is assumed to have given up on it
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv('SCHEDULER_QUEUE_TIMEOUT', 25))
+
+# Optional local archive of conversations (disabled unless ARCHIVE_DIR is set)
+archive = None
+if os.getenv('ARCHIVE_DIR'):
+    archive = ConversationArchive(
+        os.getenv('ARCHIVE_DIR'),
+        segment_max_bytes=int(os.getenv('ARCHIVE_SEGMENT_MB', 16)) * 1024 * 1024,
+        retention_days=float(os.getenv('ARCHIVE_RETENTION_DAYS')) if os.getenv('ARCHIVE_RETENTION_DAYS') else None
+    )
+    atexit.register(archive.close)
+
+def load_warmup_questions() -> list:
+    """Load the curated warm-up questions, if configured"""
+    if not os.getenv('WARMUP_QUESTIONS_FILE'):
+        return []
+    try:
+        return load_questions_file(os.getenv('WARMUP_QUESTIONS_FILE'))
+    except OSError as e:
+        logger.error(f"Failed to load warm-up questions: {str(e)}")
+        return []
+
+
+warmup_questions = load_warmup_questions()
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', 50)) if archive is not None else 0
+
+# Cache of answers to repeated questions; on by default only when there are
+# warm-up questions to fill it with
+completion_cache = None
+if os.getenv('COMPLETION_CACHE', 'true' if warmup_questions or WARMUP_TOP_N > 0 else 'false').lower() == 'true':
+    completion_cache = CompletionCache(
+        max_entries=int(os.getenv('COMPLETION_CACHE_SIZE', 1000)),
+        ttl=float(os.getenv('COMPLETION_CACHE_TTL', 3600))
+    )
+
+
+def build_cache_warmer() -> CacheWarmer:
+    """Create the cache warm-up from curated and archived top questions"""
+    # Mined in the warm-up thread so a large archive does not delay start-up
+    question_loader = None
+    if WARMUP_TOP_N > 0:
+        question_loader = partial(mine_top_questions, archive, WARMUP_TOP_N)
+
+    # Each pod warms its own shard before ready and the rest slowly
+    # afterwards. Deployment pods have no ordinal, so the shard comes from
+    # the pod name; two pods sharing a shard only means some overlap.
+    shards = int(os.getenv('WARMUP_SHARDS', 1))
+    if os.getenv('WARMUP_SHARD'):
+        shard = int(os.getenv('WARMUP_SHARD'))
+    else:
+        shard = shard_of(os.getenv('HOSTNAME', ''), shards)
+
+    return CacheWarmer(
+        litemaas_client,
+        completion_cache,
+        warmup_questions,
+        concurrency=int(os.getenv('WARMUP_CONCURRENCY', 2)),
+        timeout=float(os.getenv('WARMUP_TIMEOUT', 45)),
+        shard=shard,
+        shards=shards,
+        scheduler=scheduler,
+        question_loader=question_loader,
+        stagger=float(os.getenv('WARMUP_STAGGER', 60)),
+        state_file=os.getenv('WARMUP_STATE_FILE', '/tmp/mentor-bot-warmup.json')
+    )
+
+
+cache_warmer = None
+if completion_cache is not None:
+    cache_warmer = build_cache_warmer()
+    if cache_warmer.has_work():
+        cache_warmer.start()
+
+
+def get_client_id() -> str:
+    """Identify the requesting client for fair scheduling"""
+    # remote_addr is already resolved from trusted proxy headers by ProxyFix
+    return request.remote_addr or 'unknown'
+
+
+def is_health_check() -> bool:
+    """
+    Whether the request is a synthetic health-check prompt.
+
+    The X-Health-Check header must carry HEALTH_CHECK_TOKEN; without a
+    configured token only requests from the pod itself are accepted.
+    """
+    header = request.headers.get('X-Health-Check')
+    if not header:
+        return False
+    if HEALTH_CHECK_TOKEN:
+        return hmac.compare_digest(header, HEALTH_CHECK_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+def get_upstream_completion(user_message: str, client_id: str):
+    """
+    Get a completion from LiteMAAS through the fair scheduler.
+
+    Args:
+        user_message: Sanitized user message
+        client_id: Identity used for fair scheduling
+
+    Returns:
+        Tuple of (response, latency in ms); response is None if the
+        scheduler dropped the request
+    """
+    # Schedule by question class; synthetic health-check prompts go first
+    question_class = classify_question(user_message)
+    health_check = is_health_check()
+    if health_check:
+        priority = PRIORITY_HEALTH
+    else:
+        priority = QUESTION_CLASS_PRIORITY[question_class]
+    cost = count_tokens(user_message) + QUESTION_CLASS_MAX_TOKENS[question_class]
+    deadline = time.monotonic() + SCHEDULER_QUEUE_TIMEOUT
+
+    try:
+        with scheduler.slot(client_id, priority, cost, deadline):
+            start = time.monotonic()
+            bot_response = litemaas_client.get_completion(user_message)
+            latency_ms = (time.monotonic() - start) * 1000
+    except SchedulerRejected as e:
+        logger.warning(f"Request dropped by scheduler: {str(e)}")
+        return None, 0.0
+
+    if completion_cache is not None and not health_check and litemaas_client.last_succeeded():
+        completion_cache.set(user_message, bot_response)
+    return bot_response, latency_ms
+
 
 # Simple HTML UI template
 HTML_TEMPLATE = """
@@ -266,6 +437,24 @@ def health():
     }), 200
 
 
+@app.route('/ready')
+def ready():
+    """Readiness endpoint, not ready until the cache warm-up allows it"""
+    if cache_warmer is not None and not cache_warmer.is_ready():
+        return jsonify({
+            'status': 'warming_up',
+            'service': 'open-source-mentor-bot',
+            'version': '1.0.0',
+            'warmup': cache_warmer.progress()
+        }), 503
+
+    return jsonify({
+        'status': 'ready',
+        'service': 'open-source-mentor-bot',
+        'version': '1.0.0'
+    }), 200
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
@@ -273,7 +462,8 @@ def chat():
 
     Expected JSON payload:
     {
-        "message": "user's question"
+        "message": "user's question",
+        "session_id": "optional session identifier for the archive (up to 64 letters, digits or . _ : -)"
     }
 
     Returns:
@@ -296,11 +486,38 @@ def chat():
 
         logger.info(f"Received message: {user_message[:50]}...")
 
-        # Get response from LiteMAAS
-        bot_response = litemaas_client.get_completion(user_message)
+        client_id = get_client_id()
+
+        # Answer repeated questions from the cache; health checks must reach
+        # the backend
+        bot_response = None
+        if completion_cache is not None and not is_health_check():
+            bot_response = completion_cache.get(user_message)
+        cached = bot_response is not None
+        if cached:
+            latency_ms = 0.0
+        else:
+            bot_response, latency_ms = get_upstream_completion(user_message, client_id)
+            if bot_response is None:
+                return jsonify({
+                    'error': 'The mentor bot is busy right now. Please try again shortly.',
+                    'status': 'error'
+                }), 503
 
         logger.info(f"Generated response: {bot_response[:50]}...")
 
+        if archive is not None:
+            session = data.get('session_id')
+            usage = {} if cached else litemaas_client.last_usage()
+            archive.record(
+                session or client_id,
+                user_message,
+                bot_response,
+                latency_ms,
+                prompt_tokens=usage.get('prompt_tokens'),
+                completion_tokens=usage.get('completion_tokens')
+            )
+
         return jsonify({
             'response': bot_response,
             'status': 'success'
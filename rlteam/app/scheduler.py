@@ -0,0 +1,207 @@
+"""
+Fair scheduling of upstream LiteMAAS capacity across users.
+
+Requests wait for one of a fixed number of upstream slots. Waiting requests
+are served by priority class first and, within a class, by weighted fair
+queuing on the client identity: each request gets a virtual finish tag of
+``max(virtual_time, client's last tag) + cost / weight``, so a client that
+submits many long questions only gets its fair share of slots while others
+are waiting. Requests whose deadline passes while queued are dropped, since
+the browser has already given up on them.
+
+All state sits behind one lock and each waiter blocks on its own event, so a
+freed slot wakes exactly the request that should run next.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower value is served first
+PRIORITY_HEALTH = 0
+PRIORITY_GREETING = 1
+PRIORITY_SHORT = 2
+PRIORITY_LONG = 3
+
+QUESTION_CLASS_PRIORITY = {
+    'greeting': PRIORITY_GREETING,
+    'short': PRIORITY_SHORT,
+    'long': PRIORITY_LONG,
+}
+
+
+class SchedulerRejected(Exception):
+    """Raised when a request is dropped before it got an upstream slot"""
+
+
+class _Waiter:
+    """A queued request"""
+
+    __slots__ = ('client_id', 'deadline', 'event', 'granted', 'cancelled')
+
+    def __init__(self, client_id: str, deadline: Optional[float]):
+        self.client_id = client_id
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class FairScheduler:
+    """Weighted fair queue with priority classes in front of the LLM backend"""
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 100,
+                 weights: Optional[Dict[str, float]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrent: Number of upstream calls allowed at once
+            max_queue: Maximum number of waiting requests before rejecting
+            weights: Optional per-client weights (default 1.0)
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.weights = weights or {}
+
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._waiting = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+
+        self.dropped = 0
+        self.rejected = 0
+
+    def _finish_tag(self, client_id: str, cost: float) -> float:
+        """Compute the virtual finish tag for a new request (lock held)"""
+        start = max(self._virtual_time, self._last_finish.get(client_id, 0.0))
+        finish = start + cost / self.weights.get(client_id, 1.0)
+        self._last_finish[client_id] = finish
+        return finish
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the best queued waiters (lock held)"""
+        now = time.monotonic()
+        while self._active < self.max_concurrent and self._queue:
+            _, finish, _, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+
+            self._waiting -= 1
+            if waiter.deadline is not None and waiter.deadline <= now:
+                waiter.cancelled = True
+                self.dropped += 1
+                waiter.event.set()
+                continue
+
+            self._virtual_time = max(self._virtual_time, finish)
+            self._active += 1
+            waiter.granted = True
+            waiter.event.set()
+
+        if not self._queue:
+            # Idle: forget old tags so they do not grow without bound
+            self._last_finish.clear()
+
+    def acquire(self, client_id: str, priority: int = PRIORITY_SHORT,
+                cost: float = 1.0, deadline: Optional[float] = None) -> None:
+        """
+        Wait for an upstream slot.
+
+        Args:
+            client_id: Identity used for fair sharing (e.g. client address)
+            priority: Priority class, lower is served first
+            cost: Relative cost of the request, e.g. its token budget
+            deadline: time.monotonic() value after which the request is dropped
+
+        Raises:
+            SchedulerRejected: If the queue is full or the deadline passed
+        """
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                return
+
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerRejected("Too many requests are waiting")
+
+            waiter = _Waiter(client_id, deadline)
+            finish = self._finish_tag(client_id, cost)
+            heapq.heappush(self._queue, (priority, finish, next(self._seq), waiter))
+            self._waiting += 1
+            self._dispatch()
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        waiter.event.wait(timeout)
+
+        with self._lock:
+            if waiter.granted:
+                return
+            if not waiter.cancelled:
+                # Timed out while still queued; _dispatch skips it later
+                waiter.cancelled = True
+                self._waiting -= 1
+                self.dropped += 1
+
+        raise SchedulerRejected("Request deadline passed while queued")
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot only if one is free and nobody is waiting.
+
+        Returns:
+            True if a slot was taken; it must be given back with release()
+        """
+        with self._lock:
+            if self._active < self.max_concurrent and self._waiting == 0:
+                self._active += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """Return an upstream slot and wake the next waiter"""
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, client_id: str, priority: int = PRIORITY_SHORT,
+             cost: float = 1.0, deadline: Optional[float] = None):
+        """
+        Context manager holding an upstream slot for the duration of a call.
+
+        Args:
+            client_id: Identity used for fair sharing
+            priority: Priority class, lower is served first
+            cost: Relative cost of the request
+            deadline: time.monotonic() value after which the request is dropped
+
+        Raises:
+            SchedulerRejected: If the request could not get a slot
+        """
+        self.acquire(client_id, priority, cost, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """Return a snapshot of the scheduler state"""
+        with self._lock:
+            return {
+                'active': self._active,
+                'waiting': self._waiting,
+                'max_concurrent': self.max_concurrent,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,195 @@
+"""
+Approximate token estimation and output budget planning.
+
+The LLM backend does not expose its tokenizer, so we approximate it locally:
+words are split into pieces of at most four characters and every punctuation
+mark counts as its own token. This tracks BPE tokenizers closely enough for
+English prose to plan budgets, and the drift against the backend's real
+``usage`` numbers is recorded so the approximation can be checked.
+"""
+
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# One piece per approximate token, each keeping its leading whitespace so that
+# joining a prefix of pieces reproduces a prefix of the original text
+TOKEN_PATTERN = re.compile(r'\s*(?:\w{1,4}|[^\w\s])')
+
+# Output budgets (max_tokens) per question class
+GREETING_MAX_TOKENS = 150
+SHORT_QUESTION_MAX_TOKENS = 600
+LONG_QUESTION_MAX_TOKENS = 1500
+
+# Questions up to this many tokens are considered short
+SHORT_QUESTION_TOKENS = 20
+
+# Smallest budget worth sending upstream
+MIN_MAX_TOKENS = 64
+
+# Tokens kept free for chat template overhead and estimation error
+CONTEXT_SAFETY_MARGIN = 64
+
+GREETING_PATTERN = re.compile(
+    r'^(hi|hello|hey|hiya|howdy|greetings|good (morning|afternoon|evening)|'
+    r'thanks|thank you|bye|goodbye)\b[\s!.,?]*(there|bot|mentor)?[\s!.,?]*$',
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def _tokenize(text: str) -> tuple:
+    """Split text into approximate token pieces (cached)."""
+    return tuple(TOKEN_PATTERN.findall(text))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into approximate token pieces.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        List of pieces; concatenating them gives back the text without
+        trailing whitespace
+    """
+    if not text:
+        return []
+    return list(_tokenize(text))
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Approximate token count
+    """
+    if not text:
+        return 0
+    return len(_tokenize(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """
+    Truncate text to at most max_tokens, cutting on a token boundary.
+
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+        suffix: Appended when the text was truncated
+
+    Returns:
+        The original text if it fits, otherwise its first max_tokens pieces
+        followed by suffix
+    """
+    pieces = _tokenize(text) if text else ()
+    if len(pieces) <= max_tokens:
+        return text
+    return ''.join(pieces[:max_tokens]) + suffix
+
+
+def classify_question(text: str) -> str:
+    """
+    Classify a user message for output budget planning.
+
+    Args:
+        text: Sanitized user message
+
+    Returns:
+        One of 'greeting', 'short' or 'long'
+    """
+    if GREETING_PATTERN.match(text.strip()):
+        return 'greeting'
+    if count_tokens(text) <= SHORT_QUESTION_TOKENS:
+        return 'short'
+    return 'long'
+
+
+QUESTION_CLASS_MAX_TOKENS = {
+    'greeting': GREETING_MAX_TOKENS,
+    'short': SHORT_QUESTION_MAX_TOKENS,
+    'long': LONG_QUESTION_MAX_TOKENS,
+}
+
+
+def plan_max_tokens(user_message: str, prompt_tokens: int, context_window: int) -> int:
+    """
+    Plan the generation budget for a request.
+
+    The budget comes from the question class and is capped by what is left of
+    the context window once the prompt is in.
+
+    Args:
+        user_message: Sanitized user message
+        prompt_tokens: Estimated tokens of the whole prompt (system + user)
+        context_window: Model context window in tokens
+
+    Returns:
+        Value to send as max_tokens
+    """
+    budget = QUESTION_CLASS_MAX_TOKENS[classify_question(user_message)]
+    remaining = context_window - prompt_tokens - CONTEXT_SAFETY_MARGIN
+    return max(MIN_MAX_TOKENS, min(budget, remaining))
+
+
+class UsageDriftTracker:
+    """Tracks estimated vs actual prompt token counts reported by the backend"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.estimated_total = 0
+        self.actual_total = 0
+
+    def record(self, estimated: int, actual: Optional[int]) -> None:
+        """
+        Record one request's estimated and actual prompt token counts.
+
+        Args:
+            estimated: Locally estimated prompt tokens
+            actual: prompt_tokens from the backend's usage block, if any
+        """
+        if not actual:
+            return
+
+        with self._lock:
+            self.samples += 1
+            self.estimated_total += estimated
+            self.actual_total += actual
+
+        logger.info(
+            f"Prompt tokens estimated={estimated} actual={actual} "
+            f"drift={(estimated - actual) / actual:+.1%}"
+        )
+
+    def drift(self) -> Optional[float]:
+        """
+        Aggregate relative drift of the estimates.
+
+        Returns:
+            (estimated - actual) / actual over all samples, or None if no
+            usage has been reported yet
+        """
+        with self._lock:
+            if not self.actual_total:
+                return None
+            return (self.estimated_total - self.actual_total) / self.actual_total
+
+    def stats(self) -> dict:
+        """Return a snapshot of the drift statistics"""
+        drift = self.drift()
+        return {
+            'samples': self.samples,
+            'estimated_prompt_tokens': self.estimated_total,
+            'actual_prompt_tokens': self.actual_total,
+            'drift': round(drift, 4) if drift is not None else None,
+        }
@@ -6,6 +6,22 @@ import re
 import html
 from typing import Optional
 
+from app.tokenizer import truncate_to_tokens
+
+# Token budget for a sanitized user message, in estimated tokens. The old
+# 500-character cap is about 125 backend tokens of English prose (~4 chars
+# per token); the estimator counts ~3.5 chars per token on prose, i.e. ~15%
+# high, so 125 * 1.15 + headroom keeps ~560 characters of typical prose.
+# Revisit against the drift reported by UsageDriftTracker.
+MAX_INPUT_TOKENS = 160
+
+# Hard limit for an incoming chat request
+MAX_REQUEST_CHARS = 1000
+
+# Optional session identifier stored in the archive and its indexes
+MAX_SESSION_ID_CHARS = 64
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]+$')
+
 
 def sanitize_input(text: str) -> str:
     """
@@ -20,16 +36,15 @@ def sanitize_input(text: str) -> str:
     if not text:
         return ""
 
-    # Remove HTML tags
-    text = html.escape(text)
-
     # Remove excessive whitespace
     text = re.sub(r'\s+', ' ', text)
 
-    # Trim to reasonable length (prevent token exhaustion)
-    max_length = 500
-    if len(text) > max_length:
-        text = text[:max_length] + "..."
+    # Trim on a token boundary (prevent token exhaustion); done before
+    # escaping so entities like &#x27; do not eat into the budget
+    text = truncate_to_tokens(text, MAX_INPUT_TOKENS)
+
+    # Remove HTML tags
+    text = html.escape(text)
 
     # Remove potential prompt injection patterns
     # These are common patterns used to manipulate LLMs
@@ -70,8 +85,17 @@ def validate_chat_request(data: dict) -> Optional[str]:
     if not message.strip():
         return "'message' cannot be empty"
 
-    if len(message) > 1000:
-        return "'message' is too long (max 1000 characters)"
+    if len(message) > MAX_REQUEST_CHARS:
+        return f"'message' is too long (max {MAX_REQUEST_CHARS} characters)"
+
+    session_id = data.get('session_id')
+    if session_id is not None and session_id != "":
+        if not isinstance(session_id, str):
+            return "'session_id' must be a string"
+        if len(session_id) > MAX_SESSION_ID_CHARS:
+            return f"'session_id' is too long (max {MAX_SESSION_ID_CHARS} characters)"
+        if not SESSION_ID_PATTERN.match(session_id):
+            return "'session_id' may only contain letters, digits and . _ : -"
 
     return None
 
@@ -0,0 +1,342 @@
+"""
+Cache warm-up from curated and frequently asked questions.
+
+New pods precompute answers to the top questions before reporting ready, so
+the first wave of users after a deploy or scale-out hits a warm completion
+cache.
+
+Only one worker process per pod warms: the one holding the lock on the
+warm-up state file. It writes its progress and answers to that file, and the
+other workers load the answers into their own cache and report the same
+readiness, so it does not matter which worker answers the probe.
+
+Questions are split into WARMUP_SHARDS shards and each pod picks one from
+its name (or WARMUP_SHARD). Only the pod's own shard gates readiness; the
+rest is warmed afterwards one at a time, after a random delay, so a
+scale-out does not send the whole list upstream from every new pod at once.
+Pods that land on the same shard just overlap, since the background pass
+fills in everything else anyway.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from app.cache import CompletionCache, normalize_question
+from app.scheduler import PRIORITY_LONG, SchedulerRejected
+from app.tokenizer import LONG_QUESTION_MAX_TOKENS, count_tokens
+from app.utils import sanitize_input
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reads of the state file by workers that do not warm
+FOLLOWER_POLL_INTERVAL = 1.0
+
+
+def load_questions_file(path: str) -> List[str]:
+    """
+    Load curated questions, one per line.
+
+    Blank lines and lines starting with '#' are ignored.
+
+    Args:
+        path: Path to the questions file
+
+    Returns:
+        Questions in file order
+    """
+    questions = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                questions.append(line)
+    return questions
+
+
+def mine_top_questions(archive, limit: int, days: float = 7.0) -> List[str]:
+    """
+    Find the most frequently asked questions in the conversation archive.
+
+    Args:
+        archive: ConversationArchive to read
+        limit: Number of questions to return
+        days: How far back to look
+
+    Returns:
+        Up to limit questions, most frequent first
+    """
+    counts = Counter()
+    examples = {}
+    for record in archive.query(start=time.time() - days * 86400, fields=('prompt',)):
+        key = normalize_question(record['prompt'])
+        counts[key] += 1
+        examples.setdefault(key, record['prompt'])
+    return [examples[key] for key, _ in counts.most_common(limit)]
+
+
+def shard_of(question: str, shards: int) -> int:
+    """Stable shard number of a question or pod name"""
+    digest = hashlib.md5(normalize_question(question).encode('utf-8')).hexdigest()
+    return int(digest, 16) % shards
+
+
+class CacheWarmer:
+    """Precomputes answers into the completion cache and gates readiness"""
+
+    def __init__(self, client, cache: CompletionCache, questions: List[str],
+                 concurrency: int = 2, timeout: float = 45.0,
+                 shard: int = 0, shards: int = 1, scheduler=None,
+                 question_loader: Optional[Callable[[], List[str]]] = None,
+                 stagger: float = 60.0, state_file: Optional[str] = None):
+        """
+        Initialize the warmer.
+
+        Args:
+            client: LiteMAASClient used to compute answers
+            cache: Completion cache to fill
+            questions: Questions to warm, most important first
+            concurrency: Maximum upstream calls in flight while gating readiness
+            timeout: Seconds after which the pod is ready regardless of progress
+            shard: This replica's shard, warmed before reporting ready
+            shards: Number of shards the questions are split into
+            scheduler: Optional FairScheduler to share upstream capacity with
+            question_loader: Optional extra source of questions (e.g. mined from
+                the archive), called in the warm-up thread
+            stagger: Maximum random delay before warming other shards
+            state_file: File shared by the worker processes of a pod; only the
+                process holding its lock warms
+        """
+        self.client = client
+        self.cache = cache
+        self.questions = list(questions)
+        self.question_loader = question_loader
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.shard = shard % shards
+        self.shards = shards
+        self.scheduler = scheduler
+        self.stagger = stagger
+        self.state_file = state_file
+
+        self.gating: List[str] = []
+        self.background: List[str] = []
+        self.leader = False
+
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._planned = False
+        self._gating_done = 0
+        self._answers = {}
+        self._shared_state: Optional[dict] = None
+        self.done = 0
+        self.failed = 0
+        self._started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def has_work(self) -> bool:
+        """Whether there is anything to warm"""
+        return bool(self.questions or self.question_loader)
+
+    def start(self) -> None:
+        """Start warming, or following another worker's warm-up, in the background"""
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='cache-warmup', daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for the warm-up to finish"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _try_lead(self) -> bool:
+        """Take the pod-wide warm-up lock if no other worker holds it"""
+        if self.state_file is None:
+            return True
+        lock_file = open(self.state_file + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _read_state(self) -> Optional[dict]:
+        """Read the shared warm-up state of this pod, if any"""
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Workers share the gunicorn master; ignore a file left by an earlier run
+        if not isinstance(state, dict) or state.get('master') != os.getppid():
+            return None
+        return state
+
+    def _write_state(self, finished: bool = False) -> None:
+        """Publish progress and answers to the other workers of the pod"""
+        if self.state_file is None:
+            return
+        with self._lock:
+            state = {
+                'master': os.getppid(),
+                'progress': self._progress(),
+                'ready': self._gating_done >= len(self.gating),
+                'finished': finished,
+                'answers': dict(self._answers),
+            }
+        tmp = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            logger.warning(f"Failed to write warm-up state: {str(e)}")
+
+    def _load_answers(self, state: Optional[dict]) -> None:
+        """Copy answers published by the warming worker into our cache"""
+        if not state:
+            return
+        for question, answer in state.get('answers', {}).items():
+            if not self.cache.contains(question):
+                self.cache.set(question, answer)
+            self._answers.setdefault(question, answer)
+
+    def _plan(self) -> None:
+        """Collect, deduplicate and shard the questions"""
+        questions = list(self.questions)
+        if self.question_loader is not None:
+            try:
+                questions += self.question_loader()
+            except Exception as e:
+                logger.error(f"Failed to load warm-up questions: {str(e)}", exc_info=True)
+
+        # Deduplicate after sanitizing, as /api/chat does before the cache lookup
+        unique = {}
+        for question in questions:
+            question = sanitize_input(question)
+            if question:
+                unique.setdefault(normalize_question(question), question)
+        questions = list(unique.values())
+
+        with self._lock:
+            self.gating = [q for q in questions if shard_of(q, self.shards) == self.shard]
+            self.background = [q for q in questions if shard_of(q, self.shards) != self.shard]
+            self._planned = True
+
+    def _warm(self, question: str, gating: bool) -> None:
+        """Compute and cache the answer to one question"""
+        ok = True
+        answer = None
+        if not self.cache.contains(question):
+            try:
+                if self.scheduler is not None:
+                    cost = count_tokens(question) + LONG_QUESTION_MAX_TOKENS
+                    with self.scheduler.slot('warmup', PRIORITY_LONG, cost):
+                        answer = self.client.get_completion(question)
+                else:
+                    answer = self.client.get_completion(question)
+                ok = self.client.last_succeeded()
+                if ok:
+                    self.cache.set(question, answer)
+            except SchedulerRejected:
+                ok = False
+            except Exception as e:
+                logger.error(f"Warm-up failed for a question: {str(e)}", exc_info=True)
+                ok = False
+
+        with self._lock:
+            self.done += 1
+            if gating:
+                self._gating_done += 1
+            if not ok:
+                self.failed += 1
+            elif answer is not None:
+                self._answers[question] = answer
+        self._write_state()
+
+    def _run(self) -> None:
+        """Follow the pod's warming worker until it goes away, then lead"""
+        while not self._try_lead():
+            state = self._read_state()
+            with self._lock:
+                self._shared_state = state
+            self._load_answers(state)
+            if state and state.get('finished'):
+                return
+            time.sleep(FOLLOWER_POLL_INTERVAL)
+
+        self.leader = True
+        self._load_answers(self._read_state() if self.state_file else None)
+        self._lead()
+
+    def _lead(self) -> None:
+        """Warm this replica's shard, then the others slowly"""
+        self._plan()
+        logger.info(
+            f"Warming completion cache: {len(self.gating)} questions before ready, "
+            f"{len(self.background)} after"
+        )
+        self._write_state()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='cache-warmup') as pool:
+            list(pool.map(lambda q: self._warm(q, True), self.gating))
+        logger.info(f"Warm-up shard done: {self.progress()}")
+
+        if self.background:
+            # Other replicas own these shards; spread our copy out over time
+            time.sleep(random.uniform(0, self.stagger))
+            for question in self.background:
+                self._warm(question, False)
+
+        self._write_state(finished=True)
+        logger.info(f"Warm-up finished: {self.progress()}")
+
+    def _timed_out(self) -> bool:
+        return (self._started_at is not None
+                and time.monotonic() - self._started_at >= self.timeout)
+
+    def is_ready(self) -> bool:
+        """
+        Whether the pod may report ready.
+
+        Returns:
+            True once this replica's shard is warm (as published by the
+            warming worker of the pod) or the timeout has passed
+        """
+        if not self.has_work():
+            return True
+        with self._lock:
+            if self.leader:
+                if self._planned and self._gating_done >= len(self.gating):
+                    return True
+            elif self._shared_state and self._shared_state.get('ready'):
+                return True
+        return self._timed_out()
+
+    def _progress(self) -> dict:
+        """Progress counters (lock held)"""
+        return {
+            'shard_total': len(self.gating),
+            'shard_done': self._gating_done,
+            'total': len(self.gating) + len(self.background),
+            'done': self.done,
+            'failed': self.failed,
+        }
+
+    def progress(self) -> dict:
+        """Return a snapshot of the warm-up progress"""
+        with self._lock:
+            if not self.leader and self._shared_state:
+                return self._shared_state.get('progress', self._progress())
+            return self._progress()
@@ -0,0 +1,3 @@
+"""
+Benchmarks and simulations for the Open Source Mentor Bot
+"""
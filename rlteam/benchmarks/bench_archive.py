@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Cost of archiving on the chat path, and of reading the archive back.
+
+Measures how long ConversationArchive.record() blocks the calling request
+thread, then how fast the written segments can be queried.
+
+Run from the rlteam directory:
+    python -m benchmarks.bench_archive
+"""
+
+import statistics
+import tempfile
+import time
+
+from app.archive import ConversationArchive
+
+RECORDS = 50000
+PROMPT = "How do I contribute my first pull request to an open source project?"
+ANSWER = "Start by reading the CONTRIBUTING guide, pick a good first issue. " * 8
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        archive = ConversationArchive(directory, segment_max_bytes=4 * 1024 * 1024,
+                                      max_pending=RECORDS)
+
+        timings = []
+        for i in range(RECORDS):
+            start = time.perf_counter()
+            archive.record(f"session-{i % 500}", PROMPT, ANSWER, 2900.0,
+                           prompt_tokens=120, completion_tokens=300)
+            timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        archive.flush()
+        drain = time.perf_counter() - start
+
+        timings.sort()
+        print(f"record(): mean={statistics.mean(timings) * 1e6:.1f}us "
+              f"p99={timings[int(len(timings) * 0.99)] * 1e6:.1f}us "
+              f"dropped={archive.dropped}")
+        print(f"writer drained backlog in {drain:.2f}s")
+
+        start = time.perf_counter()
+        records = archive.query()
+        print(f"full scan: {len(records)} records in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        records = archive.query(session='session-42')
+        print(f"session query: {len(records)} records in {time.perf_counter() - start:.3f}s")
+
+        archive.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Simulation of hedged requests against a heavy-tailed backend.
+
+The upstream call is replaced by a stub whose latency is usually short but
+occasionally very long, like LiteMAAS answers that take 3 s most of the time
+and 25 s sometimes. The same workload runs with and without hedging and the
+latency percentiles and extra upstream calls are printed.
+
+Run from the rlteam directory:
+    python -m benchmarks.bench_hedging
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.litemaas_client import LiteMAASClient
+
+REQUESTS = 400
+CONCURRENCY = 8
+FAST_LATENCY = 0.03
+SLOW_LATENCY = 0.5
+SLOW_FRACTION = 0.04
+WARMUP_SAMPLES = 50
+
+RESPONSE = {'choices': [{'message': {'content': 'Stub answer'}}]}
+
+
+class StubClient(LiteMAASClient):
+    """LiteMAAS client whose upstream calls sleep for a heavy-tailed time"""
+
+    def __init__(self, **kwargs):
+        super().__init__('http://stub', 'stub', **kwargs)
+        self.upstream_calls = 0
+        self._calls_lock = threading.Lock()
+        self._random = random.Random(42)
+
+    def _post(self, http, endpoint, headers, payload, timeout=30.0):
+        with self._calls_lock:
+            self.upstream_calls += 1
+            slow = self._random.random() < SLOW_FRACTION
+        start = time.monotonic()
+        time.sleep(SLOW_LATENCY if slow else FAST_LATENCY * (1 + self._random.random()))
+        self.latency.record(time.monotonic() - start)
+        return RESPONSE
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def run(hedge: bool) -> None:
+    """Run the workload and print latency percentiles and upstream cost"""
+    client = StubClient(hedge=hedge, hedge_min_delay=0.0)
+    for _ in range(WARMUP_SAMPLES):
+        client.latency.record(FAST_LATENCY * 1.5)
+
+    def request(_):
+        start = time.monotonic()
+        client.get_completion('What is Podman?')
+        return time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        latencies = list(pool.map(request, range(REQUESTS)))
+
+    extra = client.upstream_calls - REQUESTS
+    print(
+        f"{'hedged' if hedge else 'plain':7s} "
+        f"p50={percentile(latencies, 50) * 1000:6.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:6.1f}ms "
+        f"max={max(latencies) * 1000:6.1f}ms "
+        f"upstream calls={client.upstream_calls} (+{extra / REQUESTS:.1%})"
+    )
+
+
+if __name__ == '__main__':
+    run(hedge=False)
+    run(hedge=True)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Simulation of upstream slot scheduling under a few heavy users.
+
+Two heavy users flood the bot with long questions while several light users
+ask short questions. Upstream calls are replaced by sleeps proportional to
+the token budget. The same workload runs three times: with
+first-come-first-served admission, with fair queuing by client identity
+only (every request in the same priority class), and with fair queuing plus
+the question-class priorities used by the app. The latency percentiles of
+each user group are printed.
+
+Run from the rlteam directory:
+    python -m benchmarks.bench_scheduler
+"""
+
+import statistics
+import threading
+import time
+
+from app.scheduler import FairScheduler, PRIORITY_LONG, PRIORITY_SHORT
+
+SLOTS = 4
+HEAVY_USERS = 2
+HEAVY_REQUESTS = 30
+LIGHT_USERS = 8
+LIGHT_REQUESTS = 5
+LONG_COST = 1500
+SHORT_COST = 600
+# Simulated seconds of upstream time per token of budget
+SECONDS_PER_TOKEN = 0.00002
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def run(mode: str) -> dict:
+    """
+    Run the workload and return latencies per user group.
+
+    Args:
+        mode: 'fifo', 'fair' (one priority class, per-client fair queuing)
+            or 'priority' (fair queuing with question-class priorities)
+    """
+    scheduler = FairScheduler(max_concurrent=SLOTS, max_queue=1000)
+    latencies = {'heavy': [], 'light': []}
+    lock = threading.Lock()
+
+    def request(group, client_id, cost, priority):
+        start = time.monotonic()
+        if mode == 'priority':
+            ctx = scheduler.slot(client_id, priority, cost)
+        elif mode == 'fair':
+            # Same class for everyone: only client identity and cost differ
+            ctx = scheduler.slot(client_id, PRIORITY_SHORT, cost)
+        else:
+            # Same identity, class and cost for everyone: plain FIFO
+            ctx = scheduler.slot('fifo', PRIORITY_SHORT, 1.0)
+        with ctx:
+            time.sleep(cost * SECONDS_PER_TOKEN)
+        with lock:
+            latencies[group].append(time.monotonic() - start)
+
+    def heavy_user(n):
+        threads = [
+            threading.Thread(target=request, args=('heavy', f'heavy-{n}', LONG_COST, PRIORITY_LONG))
+            for _ in range(HEAVY_REQUESTS)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def light_user(n):
+        for _ in range(LIGHT_REQUESTS):
+            request('light', f'light-{n}', SHORT_COST, PRIORITY_SHORT)
+            time.sleep(0.01)
+
+    users = [threading.Thread(target=heavy_user, args=(n,)) for n in range(HEAVY_USERS)]
+    users += [threading.Thread(target=light_user, args=(n,)) for n in range(LIGHT_USERS)]
+    for u in users:
+        u.start()
+    for u in users:
+        u.join()
+    return latencies
+
+
+def report(name: str, latencies: dict) -> None:
+    """Print latency percentiles per user group"""
+    print(f"\n{name}")
+    for group, values in latencies.items():
+        print(
+            f"  {group:6s} n={len(values):3d} "
+            f"p50={statistics.median(values) * 1000:7.1f}ms "
+            f"p99={percentile(values, 99) * 1000:7.1f}ms "
+            f"max={max(values) * 1000:7.1f}ms"
+        )
+
+
+if __name__ == '__main__':
+    report("First-come-first-served", run('fifo'))
+    report("Weighted fair queuing, one priority class", run('fair'))
+    report("Weighted fair queuing with question-class priorities", run('priority'))
@@ -4,7 +4,9 @@ Integration tests for Flask API endpoints
 
 import pytest
 import json
-from app.main import app
+from app.cache import CompletionCache
+from app.main import app, is_health_check
+from app.scheduler import SchedulerRejected
 
 
 @pytest.fixture
@@ -28,6 +30,25 @@ class TestHealthEndpoint:
         assert data['service'] == 'open-source-mentor-bot'
         assert 'version' in data
 
+    def test_ready(self, client):
+        """Test ready endpoint returns 200 without a cache warm-up"""
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'ready'
+
+    def test_not_ready_while_warming_up(self, client, mocker):
+        """Test ready endpoint returns 503 until the cache warm-up is done"""
+        warmer = mocker.Mock()
+        warmer.is_ready.return_value = False
+        warmer.progress.return_value = {'done': 0}
+        mocker.patch('app.main.cache_warmer', warmer)
+        response = client.get('/ready')
+        assert response.status_code == 503
+
+        data = json.loads(response.data)
+        assert data['status'] == 'warming_up'
+        assert 'warmup' in data
+
 
 class TestRootEndpoint:
     """Tests for / endpoint"""
@@ -96,3 +117,91 @@ class TestChatEndpoint:
         data = json.loads(response.data)
         assert 'response' in data
         assert data['status'] == 'success'
+
+    def test_chat_returns_503_when_scheduler_rejects(self, client, mocker):
+        """Test chat endpoint reports busy when no upstream slot is available"""
+        mocker.patch(
+            'app.main.scheduler.acquire',
+            side_effect=SchedulerRejected('busy')
+        )
+
+        response = client.post(
+            '/api/chat',
+            data=json.dumps({'message': 'Hello, bot!'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 503
+        data = json.loads(response.data)
+        assert data['status'] == 'error'
+
+    def test_chat_answers_from_cache(self, client, mocker):
+        """Test chat endpoint serves cached answers without calling LiteMAAS"""
+        cache = CompletionCache()
+        cache.set('What is Podman?', 'Cached answer')
+        mocker.patch('app.main.completion_cache', cache)
+        get_completion = mocker.patch('app.main.litemaas_client.get_completion')
+
+        response = client.post(
+            '/api/chat',
+            data=json.dumps({'message': 'What is Podman?'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 200
+        assert json.loads(response.data)['response'] == 'Cached answer'
+        get_completion.assert_not_called()
+
+    def test_health_check_bypasses_cache(self, client, mocker):
+        """Test health-check prompts always reach LiteMAAS and are not cached"""
+        cache = CompletionCache()
+        cache.set('What is Podman?', 'Cached answer')
+        mocker.patch('app.main.completion_cache', cache)
+        mocker.patch('app.main.is_health_check', return_value=True)
+        mocker.patch('app.main.litemaas_client.get_completion', return_value='Live answer')
+        mocker.patch('app.main.litemaas_client.last_succeeded', return_value=True)
+
+        response = client.post(
+            '/api/chat',
+            data=json.dumps({'message': 'What is Podman?'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 200
+        assert json.loads(response.data)['response'] == 'Live answer'
+        assert cache.get('What is Podman?') == 'Cached answer'
+
+
+
+class TestClientIdentity:
+    """Tests for client identity and health-check detection"""
+
+    def test_client_id_ignores_spoofed_forwarded_for(self, client, mocker):
+        """Test only the proxy-added X-Forwarded-For entry is used"""
+        upstream = mocker.patch(
+            'app.main.get_upstream_completion',
+            return_value=('Mocked response', 1.0)
+        )
+
+        client.post(
+            '/api/chat',
+            data=json.dumps({'message': 'Tell me about Podman'}),
+            content_type='application/json',
+            headers={'X-Forwarded-For': '6.6.6.6, 10.1.2.3'}
+        )
+        assert upstream.call_args[0][1] == '10.1.2.3'
+
+    def test_health_check_requires_token(self, mocker):
+        """Test X-Health-Check only counts with the shared secret"""
+        mocker.patch('app.main.HEALTH_CHECK_TOKEN', 's3cret')
+        with app.test_request_context('/', headers={'X-Health-Check': '1'}):
+            assert is_health_check() is False
+        with app.test_request_context('/', headers={'X-Health-Check': 's3cret'}):
+            assert is_health_check() is True
+
+    def test_health_check_without_token_only_from_loopback(self):
+        """Test X-Health-Check without a token is only trusted from the pod"""
+        headers = {'X-Health-Check': '1'}
+        with app.test_request_context('/', headers=headers,
+                                      environ_base={'REMOTE_ADDR': '10.1.2.3'}):
+            assert is_health_check() is False
+        with app.test_request_context('/', headers=headers,
+                                      environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            assert is_health_check() is True
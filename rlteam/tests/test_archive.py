@@ -0,0 +1,246 @@
+"""
+Unit tests for the conversation archive
+"""
+
+import os
+import time
+
+import pytest
+from app.archive import ConversationArchive
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Create an archive with tiny segments in a temporary directory"""
+    archive = ConversationArchive(str(tmp_path), segment_max_bytes=400)
+    yield archive
+    archive.close()
+
+
+def segment_files(directory):
+    """List the segment files in directory"""
+    return sorted(name for name in os.listdir(directory) if name.endswith('.jsonl'))
+
+
+class TestConversationArchive:
+    """Tests for ConversationArchive"""
+
+    def test_record_and_query(self, archive):
+        archive.record('s1', 'What is Podman?', 'A container engine.', 812.5,
+                       prompt_tokens=90, completion_tokens=12)
+        archive.flush()
+
+        records = archive.query()
+        assert len(records) == 1
+        assert records[0]['session'] == 's1'
+        assert records[0]['prompt'] == 'What is Podman?'
+        assert records[0]['answer'] == 'A container engine.'
+        assert records[0]['latency_ms'] == 812.5
+        assert records[0]['prompt_tokens'] == 90
+        assert records[0]['completion_tokens'] == 12
+
+    def test_query_selected_fields(self, archive):
+        archive.record('s1', 'What is Podman?', 'A container engine.', 812.5)
+        archive.flush()
+
+        records = archive.query(fields=('prompt',))
+        assert set(records[0]) == {'ts', 'prompt'}
+
+    def test_query_by_session(self, archive):
+        for i in range(20):
+            archive.record(f's{i % 3}', f'question {i}', f'answer {i}', 10.0)
+        archive.flush()
+
+        records = archive.query(session='s1')
+        assert [r['prompt'] for r in records] == [f'question {i}' for i in range(1, 20, 3)]
+
+    def test_query_by_time_range(self, archive):
+        archive.record('s', 'old', 'a', 1.0)
+        archive.flush()
+        time.sleep(0.01)
+        middle = time.time()
+        time.sleep(0.01)
+        archive.record('s', 'new', 'a', 1.0)
+        archive.flush()
+
+        assert [r['prompt'] for r in archive.query(start=middle)] == ['new']
+        assert [r['prompt'] for r in archive.query(end=middle)] == ['old']
+        assert [r['prompt'] for r in archive.query(limit=1)] == ['new']
+
+    def test_rotation_and_compaction(self, archive, tmp_path):
+        for i in range(50):
+            archive.record('s', f'question {i}', 'answer', 1.0)
+            archive.flush()
+
+        # Sealed segments are merged, so only a few files remain
+        directory = archive.writer_directory
+        assert any(os.path.getsize(os.path.join(directory, name)) > 800
+                   for name in segment_files(directory))
+        assert len(segment_files(directory)) < 6
+        assert len(archive.query()) == 50
+
+    def test_compaction_is_tiered(self, archive):
+        for i in range(500):
+            archive.record('s', f'question {i}', 'answer', 1.0)
+            archive.flush()
+
+        # Merged segments are merged again, so files grow logarithmically
+        assert len(segment_files(archive.writer_directory)) < 10
+        assert max(index['level'] for index in archive._indexes.values()) >= 2
+        assert len(archive.query()) == 500
+
+    def test_interrupted_compaction_not_duplicated(self, tmp_path, mocker):
+        archive = ConversationArchive(str(tmp_path), segment_max_bytes=400)
+        # Crash after the merged segment is swapped in, before the originals go
+        mocker.patch.object(archive, '_remove', side_effect=OSError('crash'))
+        for i in range(50):
+            archive.record('s', f'question {i}', 'answer', 1.0)
+            archive.flush()
+        archive.close()
+        mocker.stopall()
+
+        reopened = ConversationArchive(str(tmp_path), segment_max_bytes=400)
+        try:
+            prompts = [r['prompt'] for r in reopened.query()]
+            assert sorted(prompts) == sorted(f'question {i}' for i in range(50))
+            assert not any(name.startswith('compact-')
+                           for name in os.listdir(reopened.writer_directory))
+        finally:
+            reopened.close()
+
+    def test_reopen_keeps_records(self, tmp_path):
+        archive = ConversationArchive(str(tmp_path), segment_max_bytes=400)
+        for i in range(10):
+            archive.record('s', f'question {i}', 'answer', 1.0)
+        archive.close()
+
+        reopened = ConversationArchive(str(tmp_path), segment_max_bytes=400)
+        try:
+            assert len(reopened.query()) == 10
+        finally:
+            reopened.close()
+
+    def test_retention_drops_whole_segments(self, tmp_path, mocker):
+        archive = ConversationArchive(str(tmp_path), segment_max_bytes=200, retention_days=1)
+        mocker.patch('app.archive.time.time', return_value=time.time() - 2 * 86400)
+        for i in range(5):
+            archive.record('s', f'expired {i}', 'answer', 1.0)
+            archive.flush()
+        mocker.stopall()
+        for i in range(10):
+            archive.record('s', f'fresh {i}', 'answer', 1.0)
+            archive.flush()
+        archive.close()
+
+        reopened = ConversationArchive(str(tmp_path))
+        prompts = [r['prompt'] for r in reopened.query()]
+        reopened.close()
+        # Segments holding only expired records are gone; the one shared with
+        # fresh records is kept until all of it expires
+        assert sum(p.startswith('expired') for p in prompts) < 5
+        assert sum(p.startswith('fresh') for p in prompts) == 10
+
+    def test_retention_applies_without_rotation(self, tmp_path):
+        archive = ConversationArchive(str(tmp_path))
+        archive.record('s', 'old', 'answer', 1.0)
+        archive.close()
+
+        # The active segment never filled up; reopening still expires it
+        reopened = ConversationArchive(str(tmp_path), retention_days=0)
+        try:
+            reopened.flush()
+            deadline = time.monotonic() + 5
+            while reopened.query() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert reopened.query() == []
+        finally:
+            reopened.close()
+
+    def test_idle_writer_seals_aged_segment(self, tmp_path):
+        archive = ConversationArchive(str(tmp_path), segment_max_age=0.05,
+                                      maintenance_interval=0.01)
+        try:
+            archive.record('s', 'question', 'answer', 1.0)
+            archive.flush()
+            deadline = time.monotonic() + 5
+            while not archive._indexes and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(archive._indexes) == 1
+            assert [r['prompt'] for r in archive.query()] == ['question']
+        finally:
+            archive.close()
+
+    def test_retention_does_not_rewrite_live_segments(self, tmp_path, mocker):
+        archive = ConversationArchive(str(tmp_path), segment_max_bytes=200, retention_days=1)
+        for i in range(6):
+            archive.record('s', f'question {i}', 'answer', 1.0)
+            archive.flush()
+        rewrite = mocker.spy(archive, '_write_index')
+        archive.record('s', 'one more question', 'answer', 1.0)
+        archive.flush()
+        archive.close()
+        # Only the rotated segment is indexed, nothing is merged for retention
+        assert rewrite.call_count <= 1
+
+    def test_processes_use_separate_writer_directories(self, tmp_path):
+        first = ConversationArchive(str(tmp_path), segment_max_bytes=200)
+        second = ConversationArchive(str(tmp_path), segment_max_bytes=200)
+        try:
+            assert first.writer_directory != second.writer_directory
+            for i in range(20):
+                first.record('a', f'first {i}', 'answer', 1.0)
+                second.record('b', f'second {i}', 'answer', 1.0)
+            first.flush()
+            second.flush()
+
+            assert len(first.query()) == 40
+            assert len(second.query(session='a')) == 20
+            assert first._writer.is_alive() and second._writer.is_alive()
+        finally:
+            first.close()
+            second.close()
+
+    def test_partial_last_line_recovered(self, tmp_path):
+        archive = ConversationArchive(str(tmp_path))
+        archive.record('s', 'complete', 'answer', 1.0)
+        archive.close()
+
+        # Simulate a crash in the middle of a write
+        active = os.path.join(archive.writer_directory, segment_files(archive.writer_directory)[-1])
+        with open(active, 'ab') as f:
+            f.write(b'{"t":1.0,"s":"s","q":"half')
+
+        reopened = ConversationArchive(str(tmp_path))
+        try:
+            reopened.record('s', 'after crash', 'answer', 1.0)
+            reopened.flush()
+            assert [r['prompt'] for r in reopened.query()] == ['complete', 'after crash']
+        finally:
+            reopened.close()
+
+    def test_damaged_lines_skipped(self, tmp_path):
+        archive = ConversationArchive(str(tmp_path), segment_max_bytes=200)
+        archive.record('s', 'good', 'answer', 1.0)
+        archive.flush()
+        archive._active.write(b'not json\n')
+        archive._active.flush()
+        for i in range(5):
+            archive.record('s', f'question {i}', 'answer', 1.0)
+            archive.flush()
+        try:
+            assert len(archive.query()) == 6
+        finally:
+            archive.close()
+
+    def test_writer_survives_errors(self, archive, mocker):
+        mocker.patch.object(archive, '_write', side_effect=[ValueError('boom'), None])
+        archive.record('s', 'lost', 'answer', 1.0)
+        archive.flush()
+        assert archive._writer.is_alive()
+
+    def test_full_queue_drops(self, tmp_path):
+        archive = ConversationArchive(str(tmp_path), max_pending=1)
+        archive.close()
+        archive.record('s', 'q', 'a', 1.0)
+        archive.record('s', 'q', 'a', 1.0)
+        assert archive.dropped == 1
@@ -0,0 +1,148 @@
+"""
+Unit tests for hedged LiteMAAS requests
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+from app.hedging import HedgeBudget, LatencyTracker
+from app.litemaas_client import LiteMAASClient
+from app.scheduler import FairScheduler
+
+
+def response(content):
+    """Build a minimal chat completion response"""
+    return {'choices': [{'message': {'content': content}}]}
+
+
+class TestLatencyTracker:
+    """Tests for LatencyTracker"""
+
+    def test_empty(self):
+        assert LatencyTracker().percentile(95) is None
+
+    def test_percentile(self):
+        tracker = LatencyTracker()
+        for i in range(1, 101):
+            tracker.record(i / 100)
+        assert tracker.percentile(50) == pytest.approx(0.5)
+        assert tracker.percentile(99) == pytest.approx(0.99)
+
+    def test_window(self):
+        tracker = LatencyTracker(window=3)
+        for value in (10.0, 1.0, 1.0, 1.0):
+            tracker.record(value)
+        assert tracker.percentile(100) == 1.0
+
+
+class TestHedgeBudget:
+    """Tests for HedgeBudget"""
+
+    def test_caps_hedge_ratio(self):
+        budget = HedgeBudget(ratio=0.1, max_credit=5)
+        for _ in range(20):
+            budget.record_request()
+        granted = sum(budget.try_acquire() for _ in range(10))
+        assert granted == 2  # 20 * 0.1
+
+    def test_credit_cannot_be_banked(self):
+        budget = HedgeBudget(ratio=0.1, max_credit=2)
+        for _ in range(10000):
+            budget.record_request()
+        granted = sum(budget.try_acquire() for _ in range(100))
+        assert granted == 2
+
+
+class TestHedgedCompletion:
+    """Tests for LiteMAASClient with hedging enabled"""
+
+    def make_client(self, mocker, post):
+        client = LiteMAASClient('http://primary', 'key', hedge=True,
+                                hedge_min_delay=0.0,
+                                hedge_base_url='http://backup')
+        mocker.patch.object(client, 'hedge_delay', return_value=0.05)
+        mocker.patch.object(client, '_post', side_effect=post)
+        client.hedge_budget = HedgeBudget(ratio=1.0)
+        return client
+
+    def test_fast_primary_not_hedged(self, mocker):
+        client = self.make_client(mocker, lambda http, url, h, p, timeout=30.0: response('primary'))
+        assert client.get_completion('What is Podman?') == 'primary'
+        assert client.hedge_budget.stats()['hedges'] == 0
+
+    def test_slow_primary_hedged(self, mocker):
+        release = threading.Event()
+
+        def post(http, url, headers, payload, timeout=30.0):
+            if url.startswith('http://primary'):
+                release.wait(2)
+                return response('primary')
+            return response('backup')
+
+        client = self.make_client(mocker, post)
+        assert client.get_completion('What is Podman?') == 'backup'
+        assert client.hedge_budget.stats()['hedges'] == 1
+        release.set()
+
+    def test_hedge_gets_remaining_timeout(self, mocker):
+        timeouts = {}
+
+        def post(http, url, headers, payload, timeout=30.0):
+            timeouts[url] = timeout
+            time.sleep(0.1)
+            return response(url)
+
+        client = self.make_client(mocker, post)
+        client.get_completion('What is Podman?')
+        assert timeouts['http://backup/v1/chat/completions'] < 30.0
+
+    def test_hedge_holds_scheduler_slot_until_loser_finishes(self, mocker):
+        release = threading.Event()
+
+        def post(http, url, headers, payload, timeout=30.0):
+            if url.startswith('http://primary'):
+                release.wait(2)
+                return response('primary')
+            return response('backup')
+
+        client = self.make_client(mocker, post)
+        client.scheduler = FairScheduler(max_concurrent=2)
+        assert client.get_completion('What is Podman?') == 'backup'
+        # The primary is still running upstream
+        assert client.scheduler.stats()['active'] == 1
+        release.set()
+        deadline = time.monotonic() + 2
+        while client.scheduler.stats()['active'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.scheduler.stats()['active'] == 0
+
+    def test_no_hedge_without_free_slot(self, mocker):
+        def post(http, url, headers, payload, timeout=30.0):
+            time.sleep(0.1)
+            return response(url)
+
+        client = self.make_client(mocker, post)
+        client.scheduler = FairScheduler(max_concurrent=0)
+        assert client.get_completion('What is Podman?').startswith('http://primary')
+        assert client.hedge_budget.stats()['hedges'] == 0
+
+    def test_failed_hedge_falls_back_to_primary(self, mocker):
+        def post(http, url, headers, payload, timeout=30.0):
+            if url.startswith('http://primary'):
+                time.sleep(0.2)
+                return response('primary')
+            raise requests.exceptions.ConnectionError('backup down')
+
+        client = self.make_client(mocker, post)
+        assert client.get_completion('What is Podman?') == 'primary'
+
+    def test_budget_exhausted_waits_for_primary(self, mocker):
+        def post(http, url, headers, payload, timeout=30.0):
+            time.sleep(0.1)
+            return response(url)
+
+        client = self.make_client(mocker, post)
+        client.hedge_budget = HedgeBudget(ratio=0.0)
+        assert client.get_completion('What is Podman?').startswith('http://primary')
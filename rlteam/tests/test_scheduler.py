@@ -0,0 +1,84 @@
+"""
+Unit tests for the fair scheduler
+"""
+
+import threading
+import time
+
+import pytest
+from app.scheduler import (
+    FairScheduler,
+    SchedulerRejected,
+    PRIORITY_GREETING,
+    PRIORITY_HEALTH,
+    PRIORITY_LONG,
+)
+
+
+def queue_behind(scheduler, order, client_id, priority, cost=1.0):
+    """Start a thread that waits for a slot and records when it got one"""
+    def run():
+        with scheduler.slot(client_id, priority, cost):
+            order.append(client_id)
+
+    waiting = scheduler.stats()['waiting']
+    thread = threading.Thread(target=run)
+    thread.start()
+    # Wait until the request is queued
+    while scheduler.stats()['waiting'] == waiting:
+        time.sleep(0.001)
+    return thread
+
+
+class TestFairScheduler:
+    """Tests for FairScheduler"""
+
+    def test_free_slot_granted_immediately(self):
+        scheduler = FairScheduler(max_concurrent=2)
+        with scheduler.slot('a'):
+            assert scheduler.stats()['active'] == 1
+        assert scheduler.stats()['active'] == 0
+
+    def test_priority_order(self):
+        scheduler = FairScheduler(max_concurrent=1)
+        order = []
+        scheduler.acquire('holder')
+        threads = [
+            queue_behind(scheduler, order, 'long', PRIORITY_LONG),
+            queue_behind(scheduler, order, 'greeting', PRIORITY_GREETING),
+            queue_behind(scheduler, order, 'health', PRIORITY_HEALTH),
+        ]
+        scheduler.release()
+        for t in threads:
+            t.join()
+        assert order == ['health', 'greeting', 'long']
+
+    def test_fair_share_between_clients(self):
+        scheduler = FairScheduler(max_concurrent=1)
+        order = []
+        scheduler.acquire('holder')
+        threads = [queue_behind(scheduler, order, 'heavy', PRIORITY_LONG) for _ in range(3)]
+        threads.append(queue_behind(scheduler, order, 'light', PRIORITY_LONG))
+        scheduler.release()
+        for t in threads:
+            t.join()
+        # The light client is served before the heavy client's backlog
+        assert order.index('light') == 1
+
+    def test_deadline_drops_request(self):
+        scheduler = FairScheduler(max_concurrent=1)
+        scheduler.acquire('holder')
+        with pytest.raises(SchedulerRejected):
+            scheduler.acquire('late', deadline=time.monotonic() + 0.01)
+        scheduler.release()
+        stats = scheduler.stats()
+        assert stats['dropped'] == 1
+        assert stats['waiting'] == 0
+        assert stats['active'] == 0
+
+    def test_full_queue_rejects(self):
+        scheduler = FairScheduler(max_concurrent=1, max_queue=0)
+        scheduler.acquire('holder')
+        with pytest.raises(SchedulerRejected):
+            scheduler.acquire('other')
+        assert scheduler.stats()['rejected'] == 1
@@ -0,0 +1,84 @@
+"""
+Unit tests for token estimation and budget planning
+"""
+
+import pytest
+from app.tokenizer import (
+    UsageDriftTracker,
+    classify_question,
+    count_tokens,
+    plan_max_tokens,
+    tokenize,
+    truncate_to_tokens,
+)
+
+
+class TestCountTokens:
+    """Tests for tokenize and count_tokens"""
+
+    def test_empty_string(self):
+        assert count_tokens("") == 0
+        assert tokenize("") == []
+
+    def test_words_and_punctuation(self):
+        assert count_tokens("Hello, world!") == 6  # Hell o , worl d !
+
+    def test_pieces_rebuild_text(self):
+        text = "What is Podman?  How do I start"
+        assert ''.join(tokenize(text)) == text
+
+
+class TestTruncateToTokens:
+    """Tests for truncate_to_tokens function"""
+
+    def test_short_text_unchanged(self):
+        assert truncate_to_tokens("Hello there", 10) == "Hello there"
+
+    def test_cuts_on_token_boundary(self):
+        result = truncate_to_tokens("one two three four", 2)
+        assert result == "one two..."
+
+    def test_long_word(self):
+        result = truncate_to_tokens("a" * 100, 5)
+        assert result == "a" * 20 + "..."
+
+
+class TestPlanMaxTokens:
+    """Tests for classify_question and plan_max_tokens"""
+
+    def test_classify_greeting(self):
+        assert classify_question("Hello!") == 'greeting'
+        assert classify_question("hi there") == 'greeting'
+
+    def test_classify_short_and_long(self):
+        assert classify_question("What is Podman?") == 'short'
+        assert classify_question("How do I " + "contribute to projects " * 10) == 'long'
+
+    def test_greeting_budget_smaller_than_question(self):
+        greeting = plan_max_tokens("Hello", 100, 8192)
+        question = plan_max_tokens("Explain " + "open source licensing " * 10, 100, 8192)
+        assert greeting < question
+
+    def test_capped_by_context_window(self):
+        assert plan_max_tokens("Explain " + "licensing " * 30, 900, 1200) == 236
+
+    def test_minimum_budget(self):
+        assert plan_max_tokens("What is Podman?", 5000, 4096) == 64
+
+
+class TestUsageDriftTracker:
+    """Tests for UsageDriftTracker"""
+
+    def test_no_samples(self):
+        tracker = UsageDriftTracker()
+        assert tracker.drift() is None
+        tracker.record(100, None)
+        assert tracker.stats()['samples'] == 0
+
+    def test_drift(self):
+        tracker = UsageDriftTracker()
+        tracker.record(110, 100)
+        tracker.record(90, 100)
+        tracker.record(120, 100)
+        assert tracker.drift() == pytest.approx(0.0667, abs=1e-3)
+        assert tracker.stats()['samples'] == 3
@@ -0,0 +1,180 @@
+"""
+Unit tests for the completion cache and cache warm-up
+"""
+
+import time
+
+from app.cache import CompletionCache, normalize_question
+from app.scheduler import FairScheduler
+from app.warmup import CacheWarmer, load_questions_file, mine_top_questions, shard_of
+
+
+class FakeClient:
+    """LiteMAAS client stand-in that answers by echoing the question"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self.succeeded = False
+
+    def get_completion(self, user_message):
+        self.calls.append(user_message)
+        self.succeeded = user_message not in self.fail
+        return f"answer to {user_message}" if self.succeeded else "Please try again."
+
+    def last_succeeded(self):
+        return self.succeeded
+
+
+class TestCompletionCache:
+    """Tests for CompletionCache"""
+
+    def test_normalize_question(self):
+        assert normalize_question("  What is   Podman?? ") == "what is podman"
+
+    def test_get_and_set(self):
+        cache = CompletionCache()
+        assert cache.get("What is Podman?") is None
+        cache.set("What is Podman?", "A container engine.")
+        assert cache.get("what is podman") == "A container engine."
+        assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+    def test_ttl(self):
+        cache = CompletionCache(ttl=0.01)
+        cache.set("q", "a")
+        time.sleep(0.02)
+        assert cache.get("q") is None
+
+    def test_lru_eviction(self):
+        cache = CompletionCache(max_entries=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        assert cache.contains("a")
+        assert not cache.contains("b")
+
+
+class TestQuestionSources:
+    """Tests for loading warm-up questions"""
+
+    def test_load_questions_file(self, tmp_path):
+        path = tmp_path / "questions.txt"
+        path.write_text("# FAQ\nWhat is Podman?\n\nHow do I contribute?\n")
+        assert load_questions_file(str(path)) == ["What is Podman?", "How do I contribute?"]
+
+    def test_mine_top_questions(self, mocker):
+        archive = mocker.Mock()
+        archive.query.return_value = [
+            {'prompt': 'What is Podman?'},
+            {'prompt': 'How do I contribute?'},
+            {'prompt': 'what is podman'},
+        ]
+        assert mine_top_questions(archive, 1) == ['What is Podman?']
+
+
+class TestCacheWarmer:
+    """Tests for CacheWarmer"""
+
+    def test_warms_all_questions(self):
+        client = FakeClient()
+        cache = CompletionCache()
+        warmer = CacheWarmer(client, cache, ["What is Podman?", "what is podman", "Hello"])
+        assert not warmer.is_ready()
+        warmer.start()
+        warmer.join(5)
+
+        assert warmer.is_ready()
+        assert len(client.calls) == 2
+        assert cache.get("What is Podman?") == "answer to What is Podman?"
+        assert warmer.progress()['done'] == 2
+
+    def test_failures_not_cached(self):
+        client = FakeClient(fail={"Hello"})
+        cache = CompletionCache()
+        warmer = CacheWarmer(client, cache, ["Hello"], scheduler=FairScheduler())
+        warmer.start()
+        warmer.join(5)
+
+        assert not cache.contains("Hello")
+        assert warmer.progress()['failed'] == 1
+
+    def test_sharding_splits_gating_questions(self):
+        questions = [f"question {i}" for i in range(20)]
+        warmers = [
+            CacheWarmer(FakeClient(), CompletionCache(), questions, shard=shard, shards=2)
+            for shard in range(2)
+        ]
+        for warmer in warmers:
+            warmer._plan()
+        assert len(warmers[0].gating) + len(warmers[1].gating) == 20
+        assert set(warmers[0].gating).isdisjoint(warmers[1].gating)
+        assert sorted(warmers[0].gating + warmers[0].background) == sorted(questions)
+
+    def test_pod_names_spread_over_shards(self):
+        pods = [f"mentor-bot-7d9f8c6b5-{suffix}" for suffix in
+                ("x2k4p", "q9w7z", "m3n8v", "a1b2c", "k5l6j", "r7t8y", "u9i0o", "p1o2i")]
+        assert len({shard_of(pod, 4) for pod in pods}) > 1
+
+    def test_background_shards_warmed_after_ready(self):
+        client = FakeClient()
+        questions = [f"question {i}" for i in range(10)]
+        warmer = CacheWarmer(client, CompletionCache(), questions,
+                             shard=0, shards=2, stagger=0.0)
+        warmer.start()
+        warmer.join(5)
+
+        assert warmer.is_ready()
+        assert client.calls[:len(warmer.gating)] == warmer.gating
+        assert len(client.calls) == 10
+
+    def test_question_loader_errors_are_ignored(self):
+        def loader():
+            raise OSError("archive unavailable")
+
+        client = FakeClient()
+        warmer = CacheWarmer(client, CompletionCache(), ["Hello"], question_loader=loader)
+        warmer.start()
+        warmer.join(5)
+
+        assert warmer.is_ready()
+        assert client.calls == ["Hello"]
+
+    def test_question_loader_runs_in_warmup_thread(self):
+        client = FakeClient()
+        warmer = CacheWarmer(client, CompletionCache(), [],
+                             question_loader=lambda: ["What is Podman?"])
+        assert not warmer.is_ready()
+        warmer.start()
+        warmer.join(5)
+
+        assert client.calls == ["What is Podman?"]
+        assert warmer.is_ready()
+
+    def test_only_one_worker_warms(self, tmp_path):
+        state_file = str(tmp_path / "warmup.json")
+        leader_client, follower_client = FakeClient(), FakeClient()
+        leader = CacheWarmer(leader_client, CompletionCache(), ["What is Podman?"],
+                             state_file=state_file)
+        follower_cache = CompletionCache()
+        follower = CacheWarmer(follower_client, follower_cache, ["What is Podman?"],
+                               state_file=state_file)
+        leader.start()
+        leader.join(5)
+        follower.start()
+        follower.join(5)
+
+        assert leader.leader and not follower.leader
+        assert leader_client.calls == ["What is Podman?"]
+        assert follower_client.calls == []
+        assert follower.is_ready()
+        assert follower.progress()['done'] == 1
+        assert follower_cache.get("What is Podman?") == "answer to What is Podman?"
+
+    def test_timeout_makes_ready(self):
+        warmer = CacheWarmer(FakeClient(), CompletionCache(), ["q"], timeout=0.0)
+        warmer._started_at = time.monotonic()
+        assert warmer.is_ready()
+
+    def test_no_questions_is_ready(self):
+        assert CacheWarmer(FakeClient(), CompletionCache(), []).is_ready()